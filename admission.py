@@ -0,0 +1,144 @@
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+class QueryRejectedError(Exception):
+    """Base class for queries that were not allowed to finish"""
+
+class DatabaseOverloadedError(QueryRejectedError):
+    """Raised when a query is shed instead of waiting for a free slot"""
+
+class QueryTimeoutError(QueryRejectedError):
+    """Raised when a query runs longer than its use-case timeout"""
+
+# Concurrency and transaction timeout (seconds) per use case
+QUERY_BUDGETS = {
+    "default": {"max_concurrent": 8, "timeout": 5.0},
+    "write": {"max_concurrent": 4, "timeout": 5.0},
+    "search": {"max_concurrent": 2, "timeout": 3.0},
+    "analytics": {"max_concurrent": 1, "timeout": 5.0},
+    "bulk": {"max_concurrent": 1, "timeout": 120.0}
+}
+
+class AdmissionController:
+    """Bounds how many queries may be in flight, overall and per use case.
+
+    Callers wait up to queue_timeout for a slot. Once max_queue_depth callers
+    are already waiting, new ones are shed straight away so the queue (and
+    with it tail latency) cannot grow without bound.
+    """
+
+    LATENCY_SAMPLES = 1000
+
+    def __init__(self, max_in_flight=16, max_queue_depth=32, queue_timeout=1.0, budgets=None):
+        self.max_in_flight = max_in_flight
+        self.max_queue_depth = max_queue_depth
+        self.queue_timeout = queue_timeout
+        self.budgets = dict(QUERY_BUDGETS if budgets is None else budgets)
+        self._cond = threading.Condition()
+        self._in_flight = 0
+        self._waiting = 0
+        self._stats = {}
+
+    def budget(self, use_case):
+        """Return the budget for a use case"""
+        if use_case not in self.budgets:
+            raise ValueError(f"Unknown query use case: {use_case}")
+        return self.budgets[use_case]
+
+    def _use_case_stats(self, use_case):
+        if use_case not in self._stats:
+            self._stats[use_case] = {
+                "in_flight": 0,
+                "admitted": 0,
+                "shed": 0,
+                "timed_out": 0,
+                "failed": 0,
+                "latencies": deque(maxlen=self.LATENCY_SAMPLES)
+            }
+        return self._stats[use_case]
+
+    def _has_slot(self, stats, budget):
+        return self._in_flight < self.max_in_flight and stats["in_flight"] < budget["max_concurrent"]
+
+    @contextmanager
+    def admit(self, use_case="default"):
+        """Hold a query slot for the duration of the block, yielding the budget"""
+        budget = self.budget(use_case)
+
+        with self._cond:
+            stats = self._use_case_stats(use_case)
+
+            if not self._has_slot(stats, budget):
+                if self._waiting >= self.max_queue_depth:
+                    stats["shed"] += 1
+                    raise DatabaseOverloadedError(f"Too many queries waiting, shedding '{use_case}' query")
+
+                self._waiting += 1
+                deadline = time.monotonic() + self.queue_timeout
+                try:
+                    while not self._has_slot(stats, budget):
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            stats["shed"] += 1
+                            raise DatabaseOverloadedError(f"No free slot for '{use_case}' query within {self.queue_timeout}s")
+                        self._cond.wait(remaining)
+                finally:
+                    self._waiting -= 1
+
+            self._in_flight += 1
+            stats["in_flight"] += 1
+            stats["admitted"] += 1
+
+        start = time.monotonic()
+        try:
+            yield budget
+        except QueryTimeoutError:
+            with self._cond:
+                stats["timed_out"] += 1
+            raise
+        except Exception:
+            with self._cond:
+                stats["failed"] += 1
+            raise
+        finally:
+            elapsed = time.monotonic() - start
+            with self._cond:
+                self._in_flight -= 1
+                stats["in_flight"] -= 1
+                stats["latencies"].append(elapsed)
+                self._cond.notify_all()
+
+    def metrics(self):
+        """Return a snapshot of the limiter state and per use-case latencies (ms)"""
+        with self._cond:
+            use_cases = {}
+            for use_case, stats in self._stats.items():
+                latencies = sorted(stats["latencies"])
+                use_cases[use_case] = {
+                    "in_flight": stats["in_flight"],
+                    "admitted": stats["admitted"],
+                    "shed": stats["shed"],
+                    "timed_out": stats["timed_out"],
+                    "failed": stats["failed"],
+                    "p50_ms": _percentile(latencies, 0.50) * 1000,
+                    "p99_ms": _percentile(latencies, 0.99) * 1000,
+                    "max_ms": (latencies[-1] if latencies else 0.0) * 1000
+                }
+
+            return {
+                "in_flight": self._in_flight,
+                "max_in_flight": self.max_in_flight,
+                "queue_depth": self._waiting,
+                "max_queue_depth": self.max_queue_depth,
+                "use_cases": use_cases
+            }
+
+
+def _percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    index = min(int(fraction * len(sorted_values)), len(sorted_values) - 1)
+    return sorted_values[index]
@@ -4,6 +4,7 @@ from getpass import getpass
 from prettytable import PrettyTable
 from db import Neo4jConnection
 from user import UserManager
+from admission import QueryRejectedError
 
 class SocialNetworkApp:
     def __init__(self):
@@ -19,29 +20,50 @@ class SocialNetworkApp:
             sys.exit(1)
             
         self.user_manager = UserManager(self.db)
+        self.build_filters()
         
         self.main_menu()
         
+    def build_filters(self):
+        """Build the membership filters, falling back to plain queries on failure"""
+        try:
+            success, message = self.user_manager.build_filters()
+            print(message)
+        except Exception as e:
+            print(f"Could not build membership filters, existence checks will query the database: {e}")
+        
     def main_menu(self):
         """Display the main menu"""
         while True:
             print("\n===== Main Menu =====")
             print("1. Register")
             print("2. Login")
-            print("3. Exit")
+            print("3. Membership Filter Stats")
+            print("4. Rebuild Membership Filters")
+            print("5. Database Load Stats")
+            print("6. Exit")
             
-            choice = input("\nEnter your choice (1-3): ")
+            choice = input("\nEnter your choice (1-6): ")
             
-            if choice == "1":
-                self.register_user()
-            elif choice == "2":
-                self.login_user()
-            elif choice == "3":
-                print("Thank you for using Social Network. Goodbye!")
-                self.db.close()
-                sys.exit(0)
-            else:
-                print("Invalid choice. Please try again.")
+            try:
+                if choice == "1":
+                    self.register_user()
+                elif choice == "2":
+                    self.login_user()
+                elif choice == "3":
+                    self.view_filter_stats()
+                elif choice == "4":
+                    self.build_filters()
+                elif choice == "5":
+                    self.view_load_stats()
+                elif choice == "6":
+                    print("Thank you for using Social Network. Goodbye!")
+                    self.db.close()
+                    sys.exit(0)
+                else:
+                    print("Invalid choice. Please try again.")
+            except QueryRejectedError as e:
+                print(f"Error: {e}")
                 
     def register_user(self):
         """Register a new user"""
@@ -59,6 +81,57 @@ class SocialNetworkApp:
         else:
             print(f"Error: {message}")
             
+    def view_filter_stats(self):
+        """Show membership filter statistics"""
+        print("\n===== Membership Filter Stats =====")
+        
+        success, stats = self.user_manager.filter_stats()
+        
+        if success:
+            table = PrettyTable()
+            table.field_names = ["Stat", "Users", "Follows"]
+            
+            for key in stats["users"]:
+                users_value = stats["users"][key]
+                follows_value = stats["follows"][key]
+                if isinstance(users_value, float):
+                    users_value = f"{users_value:.4%}"
+                    follows_value = f"{follows_value:.4%}"
+                table.add_row([key, users_value, follows_value])
+                
+            print(table)
+        else:
+            print(f"Error: {stats}")
+            
+    def view_load_stats(self):
+        """Show admission control metrics for the database"""
+        print("\n===== Database Load Stats =====")
+        
+        metrics = self.db.limiter_metrics()
+        
+        print(f"In flight: {metrics['in_flight']}/{metrics['max_in_flight']}")
+        print(f"Queue depth: {metrics['queue_depth']}/{metrics['max_queue_depth']}")
+        print(f"Fallbacks served: {self.user_manager.fallbacks_served}")
+        
+        if metrics["use_cases"]:
+            table = PrettyTable()
+            table.field_names = ["Use Case", "In Flight", "Admitted", "Shed", "Timed Out", "Failed", "p50 (ms)", "p99 (ms)", "Max (ms)"]
+            
+            for use_case, stats in metrics["use_cases"].items():
+                table.add_row([
+                    use_case, stats["in_flight"], stats["admitted"], stats["shed"], stats["timed_out"], stats["failed"],
+                    f"{stats['p50_ms']:.1f}", f"{stats['p99_ms']:.1f}", f"{stats['max_ms']:.1f}"
+                ])
+                
+            print(table)
+        else:
+            print("No queries executed yet.")
+            
+    def show_fallback_notice(self):
+        """Tell the user when results come from a fallback instead of a fresh query"""
+        if self.user_manager.fallback_notice:
+            print(f"Note: {self.user_manager.fallback_notice}")
+            
     def login_user(self):
         """Login an existing user"""
         print("\n===== User Login =====")
@@ -90,30 +163,33 @@ class SocialNetworkApp:
             
             choice = input("\nEnter your choice (1-10): ")
             
-            if choice == "1":
-                self.view_profile()
-            elif choice == "2":
-                self.edit_profile()
-            elif choice == "3":
-                self.follow_user()
-            elif choice == "4":
-                self.unfollow_user()
-            elif choice == "5":
-                self.view_connections()
-            elif choice == "6":
-                self.view_mutual_connections()
-            elif choice == "7":
-                self.get_friend_recommendations()
-            elif choice == "8":
-                self.search_users()
-            elif choice == "9":
-                self.explore_popular_users()
-            elif choice == "10":
-                self.user_manager.current_user = None
-                print("Logged out successfully.")
-                break
-            else:
-                print("Invalid choice. Please try again.")
+            try:
+                if choice == "1":
+                    self.view_profile()
+                elif choice == "2":
+                    self.edit_profile()
+                elif choice == "3":
+                    self.follow_user()
+                elif choice == "4":
+                    self.unfollow_user()
+                elif choice == "5":
+                    self.view_connections()
+                elif choice == "6":
+                    self.view_mutual_connections()
+                elif choice == "7":
+                    self.get_friend_recommendations()
+                elif choice == "8":
+                    self.search_users()
+                elif choice == "9":
+                    self.explore_popular_users()
+                elif choice == "10":
+                    self.user_manager.current_user = None
+                    print("Logged out successfully.")
+                    break
+                else:
+                    print("Invalid choice. Please try again.")
+            except QueryRejectedError as e:
+                print(f"Error: {e}")
                 
     def view_profile(self):
         """View user profile"""
@@ -238,6 +314,7 @@ class SocialNetworkApp:
         
         if success:
             print("\nPeople you might want to follow:")
+            self.show_fallback_notice()
             if recommendations:
                 table = PrettyTable()
                 table.field_names = ["Username", "Common Connections"]
@@ -261,6 +338,7 @@ class SocialNetworkApp:
         
         if success:
             print(f"\nSearch Results for '{search_term}':")
+            self.show_fallback_notice()
             if users:
                 table = PrettyTable()
                 table.field_names = ["Username", "Name", "Followers"]
@@ -282,6 +360,7 @@ class SocialNetworkApp:
         
         if success:
             print("\nMost Popular Users:")
+            self.show_fallback_notice()
             if users:
                 table = PrettyTable()
                 table.field_names = ["Username", "Name", "Followers"]
@@ -1,6 +1,8 @@
 import os
 from dotenv import load_dotenv
-from neo4j import GraphDatabase
+from neo4j import GraphDatabase, Query
+from neo4j.exceptions import ClientError
+from admission import AdmissionController, QueryTimeoutError
 
 load_dotenv()
 
@@ -11,6 +13,11 @@ class Neo4jConnection:
         self.password = os.getenv("NEO4J_PASSWORD")
         self.database = os.getenv("NEO4J_DATABASE", "neo4j")
         self._driver = None
+        self.limiter = AdmissionController(
+            max_in_flight=int(os.getenv("NEO4J_MAX_CONCURRENT_QUERIES", "16")),
+            max_queue_depth=int(os.getenv("NEO4J_MAX_QUEUE_DEPTH", "32")),
+            queue_timeout=float(os.getenv("NEO4J_QUEUE_TIMEOUT", "1.0"))
+        )
         
     def connect(self):
         """Connect to Neo4j database"""
@@ -27,14 +34,24 @@ class Neo4jConnection:
         if self._driver is not None:
             self._driver.close()
             
-    def execute_query(self, query, parameters=None):
-        """Execute a Cypher query and return the results"""
+    def execute_query(self, query, parameters=None, use_case="default"):
+        """Execute a Cypher query within the budget of its use case and return the results"""
         if self._driver is None:
             raise Exception("Driver not initialized. Call connect() first.")
             
         if parameters is None:
             parameters = {}
             
-        with self._driver.session(database=self.database) as session:
-            results = session.run(query, parameters)
-            return [record for record in results] 
\ No newline at end of file
+        with self.limiter.admit(use_case) as budget:
+            try:
+                with self._driver.session(database=self.database) as session:
+                    results = session.run(Query(query, timeout=budget["timeout"]), parameters)
+                    return [record for record in results]
+            except ClientError as e:
+                if e.code and "TransactionTimedOut" in e.code:
+                    raise QueryTimeoutError(f"Query exceeded the {budget['timeout']}s '{use_case}' timeout") from e
+                raise
+                
+    def limiter_metrics(self):
+        """Return admission control metrics"""
+        return self.limiter.metrics()
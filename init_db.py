@@ -22,7 +22,7 @@ def init_database():
     
     for query in constraints + indexes:
         try:
-            db.execute_query(query)
+            db.execute_query(query, use_case="bulk")
             print(f"Executed: {query}")
         except Exception as e:
             print(f"Error executing {query}: {e}")
@@ -0,0 +1,123 @@
+import hashlib
+import math
+
+class MembershipFilter:
+    """Counting Bloom filter used to skip existence queries against Neo4j.
+
+    A negative answer from might_contain() is definite, a positive answer
+    only means "maybe". Counters (instead of single bits) allow entries to
+    be removed again, e.g. when a FOLLOWS relationship is deleted.
+
+    Only keys passed to add() can be removed. Keys loaded from the bulk scan
+    are not tracked individually, so removing one could just as well hit a
+    false positive and turn real keys into false negatives; those entries
+    stay in the filter until the next rebuild.
+    """
+
+    MAX_COUNT = 255
+
+    def __init__(self, capacity, error_rate=0.01):
+        capacity = max(int(capacity), 1)
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.size = max(int(-capacity * math.log(error_rate) / (math.log(2) ** 2)), 8)
+        self.hash_count = max(int(round(self.size / capacity * math.log(2))), 1)
+        self._counters = bytearray(self.size)
+        self.count = 0
+        self._added = set()
+
+        # Observed behaviour, filled in by record_lookup()
+        self.lookups = 0
+        self.negatives = 0
+        self.false_positives = 0
+
+    def _positions(self, key):
+        """Return the counter positions for a key (double hashing)"""
+        digest = hashlib.blake2b(key.encode('utf-8'), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return [(h1 + i * h2) % self.size for i in range(self.hash_count)]
+
+    def _increment(self, key):
+        for pos in self._positions(key):
+            if self._counters[pos] < self.MAX_COUNT:
+                self._counters[pos] += 1
+        self.count += 1
+
+    def load(self, keys):
+        """Add keys from a bulk scan, these cannot be removed again"""
+        for key in keys:
+            self._increment(key)
+
+    def add(self, key):
+        """Add a key written since the filter was built"""
+        if key in self._added:
+            return
+        self._added.add(key)
+        self._increment(key)
+
+    def remove(self, key):
+        """Remove a key previously passed to add(), returns False for any other key"""
+        if key not in self._added:
+            return False
+        self._added.discard(key)
+        for pos in self._positions(key):
+            # Saturated counters stay put, we no longer know their true value
+            if self._counters[pos] < self.MAX_COUNT:
+                self._counters[pos] -= 1
+        self.count = max(self.count - 1, 0)
+        return True
+
+    def might_contain(self, key):
+        """Return False if the key is definitely absent, True if it may be present"""
+        return all(self._counters[pos] for pos in self._positions(key))
+
+    def __contains__(self, key):
+        return self.might_contain(key)
+
+    def record_lookup(self, filter_positive, exists=None):
+        """Track a lookup so the false-positive rate can be observed
+
+        exists is the answer from the database, only known for positives.
+        """
+        self.lookups += 1
+        if not filter_positive:
+            self.negatives += 1
+        elif exists is False:
+            self.false_positives += 1
+
+    def expected_false_positive_rate(self):
+        """Theoretical false-positive rate for the current fill level"""
+        return (1 - math.exp(-self.hash_count * self.count / self.size)) ** self.hash_count
+
+    def observed_false_positive_rate(self):
+        """False positives seen among lookups the filter could not rule out"""
+        positives = self.lookups - self.negatives
+        if positives == 0:
+            return 0.0
+        return self.false_positives / positives
+
+    def carry_stats(self, previous):
+        """Continue the lookup counters of the filter this one replaces"""
+        self.lookups = previous.lookups
+        self.negatives = previous.negatives
+        self.false_positives = previous.false_positives
+
+    def stats(self):
+        """Return a dictionary describing the filter"""
+        return {
+            "entries": self.count,
+            "capacity": self.capacity,
+            "size": self.size,
+            "hash_count": self.hash_count,
+            "lookups": self.lookups,
+            "skipped_queries": self.negatives,
+            "false_positives": self.false_positives,
+            "observed_fp_rate": self.observed_false_positive_rate(),
+            "expected_fp_rate": self.expected_false_positive_rate()
+        }
+
+
+def follow_key(follower, followee):
+    """Key used for a FOLLOWS relationship in the edge filter"""
+    return f"{follower}\x00{followee}"
@@ -0,0 +1,119 @@
+import threading
+import time
+
+import pytest
+
+from admission import AdmissionController, DatabaseOverloadedError, QueryTimeoutError
+
+BUDGETS = {
+    "default": {"max_concurrent": 2, "timeout": 1.0},
+    "analytics": {"max_concurrent": 1, "timeout": 1.0}
+}
+
+
+def hold_slot(controller, use_case, started, release):
+    with controller.admit(use_case):
+        started.set()
+        release.wait(5)
+
+
+def start_holder(controller, use_case="default"):
+    started = threading.Event()
+    release = threading.Event()
+    thread = threading.Thread(target=hold_slot, args=(controller, use_case, started, release))
+    thread.start()
+    assert started.wait(5)
+    return thread, release
+
+
+def test_admits_within_budget_and_records_metrics():
+    controller = AdmissionController(budgets=BUDGETS)
+
+    with controller.admit("default") as budget:
+        assert budget["timeout"] == 1.0
+        assert controller.metrics()["in_flight"] == 1
+
+    stats = controller.metrics()["use_cases"]["default"]
+    assert stats["admitted"] == 1
+    assert stats["in_flight"] == 0
+    assert controller.metrics()["in_flight"] == 0
+
+
+def test_unknown_use_case_is_rejected():
+    controller = AdmissionController(budgets=BUDGETS)
+
+    with pytest.raises(ValueError):
+        with controller.admit("analytcs"):
+            pass
+
+
+def test_queue_timeout_sheds_query():
+    controller = AdmissionController(max_queue_depth=4, queue_timeout=0.05, budgets=BUDGETS)
+    thread, release = start_holder(controller, "analytics")
+
+    try:
+        with pytest.raises(DatabaseOverloadedError):
+            with controller.admit("analytics"):
+                pass
+    finally:
+        release.set()
+        thread.join()
+
+    assert controller.metrics()["use_cases"]["analytics"]["shed"] == 1
+    assert controller.metrics()["queue_depth"] == 0
+
+
+def test_full_queue_sheds_immediately():
+    controller = AdmissionController(max_queue_depth=0, queue_timeout=5.0, budgets=BUDGETS)
+    thread, release = start_holder(controller, "analytics")
+
+    try:
+        start = time.monotonic()
+        with pytest.raises(DatabaseOverloadedError):
+            with controller.admit("analytics"):
+                pass
+        assert time.monotonic() - start < 1.0
+    finally:
+        release.set()
+        thread.join()
+
+
+def test_waiting_query_runs_once_slot_frees():
+    controller = AdmissionController(queue_timeout=5.0, budgets=BUDGETS)
+    thread, release = start_holder(controller, "analytics")
+
+    threading.Timer(0.05, release.set).start()
+    with controller.admit("analytics"):
+        pass
+    thread.join()
+
+    assert controller.metrics()["use_cases"]["analytics"]["admitted"] == 2
+
+
+def test_global_limit_applies_across_use_cases():
+    controller = AdmissionController(max_in_flight=1, queue_timeout=0.05, budgets=BUDGETS)
+    thread, release = start_holder(controller, "default")
+
+    try:
+        with pytest.raises(DatabaseOverloadedError):
+            with controller.admit("analytics"):
+                pass
+    finally:
+        release.set()
+        thread.join()
+
+
+def test_timeouts_and_failures_are_counted():
+    controller = AdmissionController(budgets=BUDGETS)
+
+    with pytest.raises(QueryTimeoutError):
+        with controller.admit("default"):
+            raise QueryTimeoutError("slow")
+    with pytest.raises(RuntimeError):
+        with controller.admit("default"):
+            raise RuntimeError("boom")
+
+    stats = controller.metrics()["use_cases"]["default"]
+    assert stats["timed_out"] == 1
+    assert stats["failed"] == 1
+    assert stats["in_flight"] == 0
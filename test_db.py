@@ -0,0 +1,47 @@
+from unittest import mock
+
+import pytest
+from neo4j.exceptions import Neo4jError
+
+from admission import QueryTimeoutError
+from db import Neo4jConnection
+
+
+def make_connection(run_side_effect=None):
+    connection = Neo4jConnection()
+    connection._driver = mock.MagicMock()
+    session = connection._driver.session.return_value.__enter__.return_value
+    session.run.return_value = [{"n": 1}]
+    session.run.side_effect = run_side_effect
+    return connection, session
+
+
+def test_use_case_timeout_is_passed_to_driver():
+    connection, session = make_connection()
+
+    assert connection.execute_query("RETURN 1 AS n", {"x": 1}, use_case="search") == [{"n": 1}]
+
+    query, parameters = session.run.call_args.args
+    assert query.text == "RETURN 1 AS n"
+    assert query.timeout == connection.limiter.budget("search")["timeout"]
+    assert parameters == {"x": 1}
+
+
+def test_transaction_timeout_raises_query_timeout_error():
+    error = Neo4jError.hydrate(message="timed out", code="Neo.ClientError.Transaction.TransactionTimedOutClientConfiguration")
+    connection, _ = make_connection(error)
+
+    with pytest.raises(QueryTimeoutError):
+        connection.execute_query("RETURN 1", use_case="analytics")
+
+    assert connection.limiter_metrics()["use_cases"]["analytics"]["timed_out"] == 1
+
+
+def test_other_client_errors_are_not_timeouts():
+    error = Neo4jError.hydrate(message="bad syntax", code="Neo.ClientError.Statement.SyntaxError")
+    connection, _ = make_connection(error)
+
+    with pytest.raises(Neo4jError) as excinfo:
+        connection.execute_query("RETURN", use_case="default")
+
+    assert not isinstance(excinfo.value, QueryTimeoutError)
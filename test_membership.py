@@ -0,0 +1,79 @@
+from membership import MembershipFilter, follow_key
+
+
+def make_filter(keys, capacity=1000):
+    membership_filter = MembershipFilter(capacity)
+    membership_filter.load(keys)
+    return membership_filter
+
+
+def test_loaded_keys_are_never_negative():
+    keys = [f"user{i}" for i in range(1000)]
+    membership_filter = make_filter(keys)
+
+    assert all(membership_filter.might_contain(key) for key in keys)
+
+
+def test_false_positive_rate_close_to_target():
+    membership_filter = make_filter([f"user{i}" for i in range(1000)])
+
+    false_positives = sum(membership_filter.might_contain(f"other{i}") for i in range(20000))
+
+    assert false_positives / 20000 < 0.02
+
+
+def test_added_key_can_be_removed():
+    membership_filter = make_filter([f"user{i}" for i in range(1000)])
+
+    membership_filter.add("new_user")
+    assert membership_filter.might_contain("new_user")
+
+    assert membership_filter.remove("new_user")
+    assert not membership_filter.remove("new_user")
+
+
+def test_remove_refuses_keys_that_were_not_added():
+    keys = [f"user{i}" for i in range(1000)]
+    membership_filter = make_filter(keys)
+    false_positive = next(f"other{i}" for i in range(100000) if membership_filter.might_contain(f"other{i}"))
+
+    assert not membership_filter.remove(false_positive)
+    assert not membership_filter.remove("user1")
+    assert all(membership_filter.might_contain(key) for key in keys)
+
+
+def test_adding_a_loaded_key_then_removing_it_keeps_it():
+    membership_filter = make_filter(["alice"])
+
+    membership_filter.add("alice")
+    membership_filter.remove("alice")
+
+    assert membership_filter.might_contain("alice")
+
+
+def test_add_is_idempotent():
+    membership_filter = make_filter([f"user{i}" for i in range(1000)])
+
+    membership_filter.add("new_user")
+    membership_filter.add("new_user")
+    membership_filter.remove("new_user")
+
+    assert membership_filter.count == 1000
+    assert all(membership_filter.might_contain(f"user{i}") for i in range(1000))
+
+
+def test_observed_false_positive_rate():
+    membership_filter = MembershipFilter(100)
+
+    membership_filter.record_lookup(False)
+    membership_filter.record_lookup(True, True)
+    membership_filter.record_lookup(True, False)
+
+    stats = membership_filter.stats()
+    assert stats["skipped_queries"] == 1
+    assert stats["false_positives"] == 1
+    assert stats["observed_fp_rate"] == 0.5
+
+
+def test_follow_key_is_directional():
+    assert follow_key("alice", "bob") != follow_key("bob", "alice")
@@ -0,0 +1,313 @@
+from neo4j.exceptions import ConstraintError
+
+from admission import DatabaseOverloadedError
+from membership import follow_key
+from user import UserManager
+
+
+class StubDB:
+    """In-memory stand-in for Neo4jConnection that records which queries run"""
+
+    def __init__(self, users=(), follows=()):
+        self.users = set(users)
+        self.follows = set(follows)
+        self.calls = []
+        self.rejected_use_cases = set()
+        self.constraint_error = False
+
+    def execute_query(self, query, parameters=None, use_case="default"):
+        parameters = parameters or {}
+        self.calls.append((_kind(query), use_case))
+
+        if use_case in self.rejected_use_cases:
+            raise DatabaseOverloadedError(f"'{use_case}' shed")
+
+        kind = _kind(query)
+        if kind == "scan_users":
+            return [{"username": username} for username in self.users]
+        if kind == "scan_follows":
+            return [{"follower": a, "followee": b} for a, b in self.follows]
+        if kind == "get_user":
+            username = parameters["username"]
+            return [{"u": {"screen_name": username}}] if username in self.users else []
+        if kind == "get_follow":
+            edge = (parameters["current_user"], parameters["username"])
+            return [{"r": edge}] if edge in self.follows else []
+        if kind == "create_user":
+            if self.constraint_error:
+                raise ConstraintError("duplicate email")
+            created = parameters["username"] not in self.users
+            self.users.add(parameters["username"])
+            return [{"created": created}]
+        if kind == "create_follow":
+            edge = (parameters["current_user"], parameters["username"])
+            if edge[0] not in self.users or edge[1] not in self.users:
+                return []
+            created = edge not in self.follows
+            self.follows.add(edge)
+            return [{"created": created}]
+        if kind == "popular":
+            return [{"username": "alice", "name": "Alice", "followers": 2}]
+        if kind == "popular_degraded":
+            return [{"username": "alice", "name": "Alice", "followers": 1}]
+        if kind == "recommendations":
+            return [{"recommendation": "bob", "common_connections": 1}]
+        if kind == "delete_follow":
+            self.follows.discard((parameters["current_user"], parameters["username"]))
+            return [{"a": {}, "b": {}}]
+        return []
+
+    def kinds(self):
+        return [kind for kind, _ in self.calls]
+
+
+def _kind(query):
+    if "OPTIONAL MATCH (:User)-[:FOLLOWS]->(u)" in query:
+        return "popular"
+    if "WHERE u.followers_count IS NOT NULL" in query:
+        return "popular_degraded"
+    if "recommended.screen_name" in query:
+        return "recommendations"
+    if "RETURN u.screen_name AS username\n" in query and "MATCH (u:User)\n" in query:
+        return "scan_users"
+    if "RETURN a.screen_name AS follower" in query:
+        return "scan_follows"
+    if "MERGE (u:User" in query:
+        return "create_user"
+    if "MERGE (a)-[r:FOLLOWS]->(b)" in query:
+        return "create_follow"
+    if "DELETE r" in query:
+        return "delete_follow"
+    if "-[r:FOLLOWS]->" in query and "RETURN r" in query:
+        return "get_follow"
+    if "MATCH (u:User {screen_name: $username})" in query and "RETURN u\n" in query:
+        return "get_user"
+    return "other"
+
+
+def make_manager(users=("alice", "bob"), follows=()):
+    db = StubDB(users, follows)
+    manager = UserManager(db)
+    manager.build_filters()
+    db.calls.clear()
+    return db, manager
+
+
+def expire_filters(manager):
+    manager.filters_built_at -= manager.FILTER_MAX_AGE + 1
+
+
+def wait_for_rebuild(manager):
+    if manager._rebuild_thread is not None:
+        manager._rebuild_thread.join(5)
+
+
+def test_negative_skips_profile_query():
+    db, manager = make_manager()
+
+    assert manager.view_profile("nobody") == (False, "User not found!")
+    assert db.calls == []
+    assert manager.user_filter.negatives == 1
+
+
+def test_positive_runs_profile_query():
+    db, manager = make_manager()
+
+    success, profile = manager.view_profile("alice")
+
+    assert success and profile["screen_name"] == "alice"
+    assert db.kinds() == ["get_user"]
+
+
+def test_false_positive_is_recorded():
+    db, manager = make_manager()
+    manager.user_filter.add("ghost")
+
+    assert manager.view_profile("ghost") == (False, "User not found!")
+    assert manager.user_filter.false_positives == 1
+
+
+def test_stale_negative_within_max_age_reports_missing_user():
+    # Intended: a user created by another console is invisible until the next rebuild
+    db, manager = make_manager()
+    db.users.add("carol")
+
+    assert manager.view_profile("carol") == (False, "User not found!")
+    assert db.calls == []
+
+
+def test_expired_filters_query_database_and_rebuild_in_background():
+    db, manager = make_manager()
+    db.users.add("carol")
+    expire_filters(manager)
+
+    success, _ = manager.view_profile("carol")
+    wait_for_rebuild(manager)
+
+    assert success
+    assert "get_user" in db.kinds()
+    assert ("scan_users", "bulk") in db.calls
+    assert manager.user_filter.might_contain("carol")
+
+
+def test_failed_rebuild_backs_off():
+    db, manager = make_manager()
+    db.rejected_use_cases.add("bulk")
+    expire_filters(manager)
+
+    for _ in range(3):
+        manager.view_profile("alice")
+        wait_for_rebuild(manager)
+
+    assert db.kinds().count("scan_users") == 1
+    assert db.kinds().count("get_user") == 3
+
+
+def test_rebuild_keeps_lookup_counters():
+    db, manager = make_manager()
+    manager.view_profile("nobody")
+    manager.view_profile("alice")
+
+    manager.build_filters()
+
+    stats = manager.filter_stats()[1]["users"]
+    assert stats["lookups"] == 2
+    assert stats["skipped_queries"] == 1
+
+
+def test_writes_during_rebuild_are_replayed():
+    db, manager = make_manager()
+    scan = manager._scan_filter_keys
+
+    def scan_then_register():
+        result = scan()
+        manager.register_user("Dave", "dave@example.com", "dave", "pw")
+        return result
+
+    manager._scan_filter_keys = scan_then_register
+    manager.build_filters()
+
+    assert manager.user_filter.might_contain("dave")
+
+
+def test_register_negative_skips_lookup():
+    db, manager = make_manager()
+
+    assert manager.register_user("Carol", "carol@example.com", "carol", "pw") == (True, "User registered successfully!")
+    assert db.kinds() == ["create_user"]
+    assert manager.user_filter.might_contain("carol")
+
+
+def test_register_stale_negative_reports_existing_user():
+    db, manager = make_manager()
+    db.users.add("carol")
+
+    assert manager.register_user("Carol", "carol@example.com", "carol", "pw") == (False, "Username already exists!")
+    assert manager.user_filter.might_contain("carol")
+
+
+def test_register_constraint_error():
+    db, manager = make_manager()
+    db.constraint_error = True
+
+    assert manager.register_user("Carol", "alice@example.com", "carol", "pw") == (False, "Username or email already exists!")
+
+
+def test_follow_negative_skips_edge_lookup():
+    db, manager = make_manager()
+    manager.current_user = {"screen_name": "alice"}
+
+    assert manager.follow_user("bob") == (True, "You are now following bob!")
+    assert db.kinds() == ["get_user", "create_follow"]
+    assert manager.follow_filter.might_contain(follow_key("alice", "bob"))
+
+
+def test_follow_stale_negative_reports_already_following():
+    db, manager = make_manager()
+    db.follows.add(("alice", "bob"))
+    manager.current_user = {"screen_name": "alice"}
+
+    assert manager.follow_user("bob") == (False, "You are already following this user!")
+    assert db.follows == {("alice", "bob")}
+
+
+def test_unfollow_negative_skips_queries():
+    db, manager = make_manager()
+    manager.current_user = {"screen_name": "alice"}
+
+    assert manager.unfollow_user("bob") == (False, "You are not following this user!")
+    assert db.calls == []
+
+
+def test_follow_then_unfollow_updates_filter():
+    db, manager = make_manager()
+    manager.current_user = {"screen_name": "alice"}
+
+    manager.follow_user("bob")
+    assert manager.unfollow_user("bob") == (True, "You have unfollowed bob!")
+
+    assert not manager.follow_filter.might_contain(follow_key("alice", "bob"))
+
+
+def test_unfollow_of_loaded_edge_leaves_filter_positive():
+    db, manager = make_manager(follows=[("alice", "bob")])
+    manager.current_user = {"screen_name": "alice"}
+
+    assert manager.unfollow_user("bob") == (True, "You have unfollowed bob!")
+    assert manager.follow_filter.might_contain(follow_key("alice", "bob"))
+
+
+def test_fresh_analytics_result_has_no_notice():
+    db, manager = make_manager()
+
+    assert manager.get_popular_users() == (True, [("alice", "Alice", 2)])
+    assert manager.fallback_notice is None
+
+
+def test_rejected_query_serves_recent_cache_with_notice():
+    db, manager = make_manager()
+    manager.get_popular_users()
+    db.rejected_use_cases.add("analytics")
+
+    assert manager.get_popular_users() == (True, [("alice", "Alice", 2)])
+    assert "cached results" in manager.fallback_notice
+    assert manager.fallbacks_served == 1
+
+
+def test_expired_cache_is_not_served():
+    db, manager = make_manager()
+    manager.get_popular_users()
+    result, cached_at = manager.fallback_cache[("popular",)]
+    manager.fallback_cache[("popular",)] = (result, cached_at - manager.FALLBACK_CACHE_TTL - 1)
+    db.rejected_use_cases.add("analytics")
+
+    assert manager.get_popular_users() == (True, [("alice", "Alice", 1)])
+    assert manager.fallback_notice == "Database busy, showing approximate results."
+
+
+def test_cold_start_popular_users_uses_degraded_query():
+    db, manager = make_manager()
+    db.rejected_use_cases.add("analytics")
+
+    assert manager.get_popular_users() == (True, [("alice", "Alice", 1)])
+    assert db.kinds() == ["popular", "popular_degraded"]
+
+
+def test_busy_when_every_fallback_is_rejected():
+    db, manager = make_manager()
+    db.rejected_use_cases.update({"analytics", "default"})
+
+    assert manager.get_popular_users() == (False, manager.BUSY_MESSAGE)
+    manager.current_user = {"screen_name": "alice"}
+    assert manager.get_friend_recommendations() == (False, manager.BUSY_MESSAGE)
+
+
+def test_follow_clears_cached_recommendations():
+    db, manager = make_manager(users=("alice", "bob", "carol"))
+    manager.current_user = {"screen_name": "alice"}
+    manager.get_friend_recommendations()
+    assert ("recommendations", "alice") in manager.fallback_cache
+
+    manager.follow_user("bob")
+
+    assert ("recommendations", "alice") not in manager.fallback_cache
@@ -1,37 +1,242 @@
+import threading
+import time
 import bcrypt
+from collections import OrderedDict
+from neo4j.exceptions import ConstraintError
 from db import Neo4jConnection
+from admission import QueryRejectedError
+from membership import MembershipFilter, follow_key
 
 class UserManager:
+    FALLBACK_CACHE_SIZE = 128
+    FALLBACK_CACHE_TTL = 300
+    BUSY_MESSAGE = "The database is busy, please try again later!"
+    # Other clients register users and follow people too, so a negative is
+    # only trusted while the filters are younger than this; older filters
+    # send lookups to the database until a background rebuild replaces them
+    FILTER_MAX_AGE = 60
+    
     def __init__(self, db_connection):
         self.db = db_connection
         self.current_user = None
+        self.user_filter = None
+        self.follow_filter = None
+        self.filters_built_at = None
+        self._filter_lock = threading.Lock()
+        self._build_lock = threading.Lock()
+        self._pending_adds = None
+        self._rebuild_thread = None
+        self._next_rebuild_at = 0
+        self.fallback_cache = OrderedDict()
+        self.fallbacks_served = 0
+        self.fallback_notice = None
+        
+    def build_filters(self, error_rate=0.01):
+        """Build the username and FOLLOWS membership filters from a bulk scan"""
+        with self._build_lock:
+            return self._build_filters(error_rate)
+            
+    def _build_filters(self, error_rate):
+        # Writes made while scanning may be missing from the scan, collect
+        # them so they can be replayed onto the new filters
+        with self._filter_lock:
+            self._pending_adds = []
+        started_at = time.monotonic()
+        
+        try:
+            usernames, follows = self._scan_filter_keys()
+        except Exception:
+            with self._filter_lock:
+                self._pending_adds = None
+            raise
+            
+        # Leave headroom so writes made while the app runs keep the error rate low
+        user_filter = MembershipFilter(max(len(usernames) * 2, 1024), error_rate)
+        user_filter.load(record['username'] for record in usernames if record['username'] is not None)
+        
+        follow_filter = MembershipFilter(max(len(follows) * 2, 1024), error_rate)
+        follow_filter.load(follow_key(record['follower'], record['followee']) for record in follows)
+        
+        with self._filter_lock:
+            new_filters = {"user_filter": user_filter, "follow_filter": follow_filter}
+            for name, key in self._pending_adds:
+                new_filters[name].add(key)
+            self._pending_adds = None
+            
+            if self.user_filter is not None:
+                user_filter.carry_stats(self.user_filter)
+            if self.follow_filter is not None:
+                follow_filter.carry_stats(self.follow_filter)
+                
+            self.user_filter = user_filter
+            self.follow_filter = follow_filter
+            self.filters_built_at = started_at
+            
+        return True, f"Loaded {len(usernames)} users and {len(follows)} follows into membership filters."
         
-    def register_user(self, name, email, username, password):
-        """UC-1: Register a new user"""
-        query = """
-        MATCH (u:User {screen_name: $username})
-        RETURN u
+    def _scan_filter_keys(self):
+        """Scan all usernames and FOLLOWS relationships"""
+        usernames = self.db.execute_query("""
+        MATCH (u:User)
+        RETURN u.screen_name AS username
+        """, use_case="bulk")
+        follows = self.db.execute_query("""
+        MATCH (a:User)-[:FOLLOWS]->(b:User)
+        RETURN a.screen_name AS follower, b.screen_name AS followee
+        """, use_case="bulk")
+        
+        return usernames, follows
+        
+    def filter_stats(self):
+        """Return statistics for the membership filters"""
+        if self.user_filter is None or self.follow_filter is None:
+            return False, "Membership filters have not been built!"
+            
+        return True, {"users": self.user_filter.stats(), "follows": self.follow_filter.stats()}
+        
+    def _query_with_fallback(self, cache_key, query, params, use_case, degraded_query=None):
+        """Run an expensive query, falling back if the database rejects it
+
+        A rejected query is answered from a cached result younger than
+        FALLBACK_CACHE_TTL, otherwise from degraded_query (a cheaper query with
+        the same columns) if given. fallback_notice describes the fallback used,
+        or is None for a fresh result. Returns None if nothing could be served.
         """
-        result = self.db.execute_query(query, {"username": username})
+        self.fallback_notice = None
+        try:
+            result = self.db.execute_query(query, params, use_case=use_case)
+        except QueryRejectedError:
+            return self._serve_fallback(cache_key, params, degraded_query)
+            
+        self.fallback_cache[cache_key] = (result, time.monotonic())
+        self.fallback_cache.move_to_end(cache_key)
+        if len(self.fallback_cache) > self.FALLBACK_CACHE_SIZE:
+            self.fallback_cache.popitem(last=False)
+            
+        return result
+        
+    def _serve_fallback(self, cache_key, params, degraded_query):
+        if cache_key in self.fallback_cache:
+            result, cached_at = self.fallback_cache[cache_key]
+            age = time.monotonic() - cached_at
+            if age <= self.FALLBACK_CACHE_TTL:
+                self.fallbacks_served += 1
+                self.fallback_cache.move_to_end(cache_key)
+                self.fallback_notice = f"Database busy, showing cached results from {int(age)}s ago."
+                return result
+            del self.fallback_cache[cache_key]
+            
+        if degraded_query is None:
+            return None
+            
+        try:
+            result = self.db.execute_query(degraded_query, params)
+        except QueryRejectedError:
+            return None
+            
+        self.fallbacks_served += 1
+        self.fallback_notice = "Database busy, showing approximate results."
+        return result
+        
+    def _filters_fresh(self):
+        """True while filter negatives can be trusted, otherwise start a background rebuild"""
+        if self.filters_built_at is None:
+            return False
+        if time.monotonic() - self.filters_built_at <= self.FILTER_MAX_AGE:
+            return True
+            
+        self._start_rebuild()
+        return False
+        
+    def _start_rebuild(self):
+        """Rebuild the filters off the request path, at most one rebuild at a time"""
+        with self._filter_lock:
+            if self._rebuild_thread is not None and self._rebuild_thread.is_alive():
+                return
+            if time.monotonic() < self._next_rebuild_at:
+                return
+                
+            self._rebuild_thread = threading.Thread(target=self._rebuild_filters, daemon=True)
+            self._rebuild_thread.start()
+            
+    def _rebuild_filters(self):
+        try:
+            self.build_filters()
+        except Exception:
+            # Back off instead of rescanning the whole graph on every lookup
+            self._next_rebuild_at = time.monotonic() + self.FILTER_MAX_AGE
+            
+    def _filter_add(self, name, key):
+        """Add a key written by this process to the current (and any rebuilding) filter"""
+        with self._filter_lock:
+            membership_filter = getattr(self, name)
+            if membership_filter is not None:
+                membership_filter.add(key)
+            if self._pending_adds is not None:
+                self._pending_adds.append((name, key))
+                
+    def _filter_remove(self, name, key):
+        """Remove a key this process added, see MembershipFilter.remove()"""
+        with self._filter_lock:
+            membership_filter = getattr(self, name)
+            if membership_filter is not None:
+                membership_filter.remove(key)
+            if self._pending_adds is not None and (name, key) in self._pending_adds:
+                self._pending_adds.remove((name, key))
+                
+    def _record_positive(self, membership_filter, exists):
+        """Record the database answer for a lookup the filter could not rule out"""
+        if membership_filter is not None:
+            membership_filter.record_lookup(True, exists)
+            
+    def _user_might_exist(self, username):
+        """False only if the username is definitely not in the database"""
+        if self.user_filter is None or not self._filters_fresh():
+            return True
+        if not self.user_filter.might_contain(username):
+            self.user_filter.record_lookup(False)
+            return False
+        return True
+        
+    def _follow_might_exist(self, follower, followee):
+        """False only if the FOLLOWS relationship is definitely not in the database"""
+        if self.follow_filter is None or not self._filters_fresh():
+            return True
+        if not self.follow_filter.might_contain(follow_key(follower, followee)):
+            self.follow_filter.record_lookup(False)
+            return False
+        return True
         
-        if result:
-            return False, "Username already exists!"
+    def register_user(self, name, email, username, password):
+        """UC-1: Register a new user"""
+        if self._user_might_exist(username):
+            query = """
+            MATCH (u:User {screen_name: $username})
+            RETURN u
+            """
+            result = self.db.execute_query(query, {"username": username})
+            
+            self._record_positive(self.user_filter, bool(result))
+            
+            if result:
+                return False, "Username already exists!"
             
         #Hash pw
         hashed_password = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
         
-        #create user node
+        #create user node, MERGE keeps this safe when the filter is stale
         query = """
-        CREATE (u:User {
-            name: $name,
-            screen_name: $username,
-            email: $email,
-            password: $password,
-            bio: "",
-            followers_count: 0,
-            friends_count: 0
-        })
-        RETURN u
+        MERGE (u:User {screen_name: $username})
+        ON CREATE SET u.name = $name,
+            u.email = $email,
+            u.password = $password,
+            u.bio = "",
+            u.followers_count = 0,
+            u.friends_count = 0,
+            u._new = true
+        WITH u, u._new IS NOT NULL AS created
+        REMOVE u._new
+        RETURN created
         """
         
         params = {
@@ -41,7 +246,16 @@ class UserManager:
             "password": hashed_password
         }
         
-        result = self.db.execute_query(query, params)
+        try:
+            result = self.db.execute_query(query, params, use_case="write")
+        except ConstraintError:
+            return False, "Username or email already exists!"
+            
+        self._filter_add("user_filter", username)
+            
+        if not result[0]['created']:
+            return False, "Username already exists!"
+            
         return True, "User registered successfully!"
     
     def login_user(self, username, password):
@@ -78,6 +292,9 @@ class UserManager:
         elif username is None:
             return False, "No user specified!"
             
+        if not self._user_might_exist(username):
+            return False, "User not found!"
+            
         query = """
         MATCH (u:User {screen_name: $username})
         RETURN u
@@ -85,6 +302,8 @@ class UserManager:
         
         result = self.db.execute_query(query, {"username": username})
         
+        self._record_positive(self.user_filter, bool(result))
+        
         if not result:
             return False, "User not found!"
             
@@ -117,7 +336,7 @@ class UserManager:
         RETURN u
         """
         
-        result = self.db.execute_query(query, params)
+        result = self.db.execute_query(query, params, use_case="write")
         self.current_user = result[0]['u']
         
         return True, "Profile updated successfully!"
@@ -131,6 +350,9 @@ class UserManager:
             return False, "You cannot follow yourself!"
             
         # Check if user exists
+        if not self._user_might_exist(username_to_follow):
+            return False, "User not found!"
+            
         query = """
         MATCH (u:User {screen_name: $username})
         RETURN u
@@ -138,39 +360,58 @@ class UserManager:
         
         result = self.db.execute_query(query, {"username": username_to_follow})
         
+        self._record_positive(self.user_filter, bool(result))
+        
         if not result:
             return False, "User not found!"
             
-        # Check if already following
-        query = """
-        MATCH (a:User {screen_name: $current_user})-[r:FOLLOWS]->(b:User {screen_name: $username})
-        RETURN r
-        """
-        
         params = {
             "current_user": self.current_user['screen_name'],
             "username": username_to_follow
         }
         
-        result = self.db.execute_query(query, params)
-        
-        if result:
-            return False, "You are already following this user!"
+        # Check if already following
+        if self._follow_might_exist(self.current_user['screen_name'], username_to_follow):
+            query = """
+            MATCH (a:User {screen_name: $current_user})-[r:FOLLOWS]->(b:User {screen_name: $username})
+            RETURN r
+            """
+            
+            result = self.db.execute_query(query, params)
+            
+            self._record_positive(self.follow_filter, bool(result))
             
-        # Create follow relationship
+            if result:
+                return False, "You are already following this user!"
+            
+        # Create follow relationship, MERGE keeps this safe when the filter is stale
         query = """
         MATCH (a:User {screen_name: $current_user}), (b:User {screen_name: $username})
-        CREATE (a)-[r:FOLLOWS]->(b)
-        
-        // Update follower/following counts
-        SET a.friends_count = a.friends_count + 1,
-            b.followers_count = b.followers_count + 1
+        MERGE (a)-[r:FOLLOWS]->(b)
+        ON CREATE SET r._new = true
+        WITH a, b, r, r._new IS NOT NULL AS created
+        REMOVE r._new
+        
+        // Update follower/following counts only for a new relationship
+        FOREACH (_ IN CASE WHEN created THEN [1] ELSE [] END |
+            SET a.friends_count = a.friends_count + 1,
+                b.followers_count = b.followers_count + 1
+        )
             
-        RETURN a, b
+        RETURN created
         """
         
-        result = self.db.execute_query(query, params)
+        result = self.db.execute_query(query, params, use_case="write")
         
+        if not result:
+            return False, "User not found!"
+            
+        self._filter_add("follow_filter", follow_key(self.current_user['screen_name'], username_to_follow))
+        self.fallback_cache.pop(("recommendations", self.current_user['screen_name']), None)
+            
+        if not result[0]['created']:
+            return False, "You are already following this user!"
+            
         return True, f"You are now following {username_to_follow}!"
         
     def unfollow_user(self, username_to_unfollow):
@@ -179,6 +420,9 @@ class UserManager:
             return False, "You must be logged in to unfollow users!"
             
         # Check if actually following
+        if not self._follow_might_exist(self.current_user['screen_name'], username_to_unfollow):
+            return False, "You are not following this user!"
+            
         query = """
         MATCH (a:User {screen_name: $current_user})-[r:FOLLOWS]->(b:User {screen_name: $username})
         RETURN r
@@ -191,6 +435,8 @@ class UserManager:
         
         result = self.db.execute_query(query, params)
         
+        self._record_positive(self.follow_filter, bool(result))
+        
         if not result:
             return False, "You are not following this user!"
             
@@ -206,8 +452,11 @@ class UserManager:
         RETURN a, b
         """
         
-        result = self.db.execute_query(query, params)
+        result = self.db.execute_query(query, params, use_case="write")
         
+        self._filter_remove("follow_filter", follow_key(self.current_user['screen_name'], username_to_unfollow))
+        self.fallback_cache.pop(("recommendations", self.current_user['screen_name']), None)
+            
         return True, f"You have unfollowed {username_to_unfollow}!"
         
     def view_connections(self):
@@ -275,7 +524,9 @@ class UserManager:
         LIMIT 5
         """
         
-        result = self.db.execute_query(query, {"username": username})
+        result = self._query_with_fallback(("recommendations", username), query, {"username": username}, "analytics")
+        if result is None:
+            return False, self.BUSY_MESSAGE
         
         recommendations = [(record['recommendation'], record['common_connections']) for record in result]
         
@@ -291,7 +542,9 @@ class UserManager:
         LIMIT 10
         """
         
-        result = self.db.execute_query(query, {"search_term": search_term})
+        result = self._query_with_fallback(("search", search_term), query, {"search_term": search_term}, "search")
+        if result is None:
+            return False, self.BUSY_MESSAGE
         
         users = [(record['username'], record['name'], record['followers']) for record in result]
         
@@ -308,8 +561,19 @@ class UserManager:
         LIMIT 10
         """
         
-        result = self.db.execute_query(query)
+        # Degraded but fast: use the stored counts, ordered via user_followers_idx
+        degraded_query = """
+        MATCH (u:User)
+        WHERE u.followers_count IS NOT NULL
+        RETURN u.screen_name AS username, u.name AS name, u.followers_count AS followers
+        ORDER BY u.followers_count DESC
+        LIMIT 10
+        """
         
+        result = self._query_with_fallback(("popular",), query, None, "analytics", degraded_query)
+        if result is None:
+            return False, self.BUSY_MESSAGE
+            
         users = [(record['username'], record['name'], record['followers']) for record in result]
         
         return True, users 
\ No newline at end of file